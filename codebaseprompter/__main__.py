@@ -1,29 +1,56 @@
 import os
+import re
+import sys
+import fnmatch
 import argparse
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Any
-import debugpy
+from typing import Any, BinaryIO
 import yaml
-import xml.etree.ElementTree as ElementTree
-from xml.dom import minidom
+from xml.sax.saxutils import escape, quoteattr
 
-# Global cache for loaded config to avoid repeated file I/O if called multiple times
+# Prefer the libyaml-backed loader when PyYAML was built with it; it is a drop-in,
+# equally safe replacement for SafeLoader that parses roughly an order of magnitude faster.
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Source files are read on a thread pool; os.read releases the GIL so the reads overlap.
+# The writer lets at most READ_AHEAD_FILES reads run ahead of it to bound memory use.
+READ_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+READ_AHEAD_FILES = READ_WORKERS * 2
+
+# Files whose first BINARY_SNIFF_BYTES contain a NUL byte are treated as binary and skipped
+BINARY_SNIFF_BYTES = 4096
+
+# Output is written through a 1 MiB buffer so the many small tag writes coalesce into few write syscalls
+OUTPUT_BUFFER_SIZE = 1 << 20
+
+# Per-file progress lines are buffered and written to stdout in batches of this size,
+# so a large project doesn't cost one terminal write per file
+PROGRESS_BATCH_LINES = 128
+
+# Global cache for loaded config to avoid repeated file I/O if called multiple times.
+# Keyed by (path, mtime) so an edited config file is picked up again.
 _config_cache = None
 
 def load_config(config_path: Path = Path("configs/config.yaml")) -> dict[str, dict[str, list[Any]]] | Any:
     """Loads configuration from a YAML file."""
     global _config_cache
-    if _config_cache is not None and _config_cache.get('path') == str(config_path):
+    try:
+        cache_key = (str(config_path), os.stat(config_path).st_mtime_ns)
+    except OSError:
+        cache_key = None  # Let the open below report the problem
+    if cache_key is not None and _config_cache is not None and _config_cache['key'] == cache_key:
         return _config_cache['data']
 
     try:
         with open(config_path, 'r', encoding='utf-8') as f:
-            config_data = yaml.safe_load(f)
+            config_data = yaml.load(f, Loader=YamlLoader)
         if not config_data or 'default_settings' not in config_data:
             print(f"Warning: Config file '{config_path}' is empty or missing 'default_settings'. Using empty defaults.")
             config_data = {'default_settings': {'source_extensions': [], 'omit_dirs': []}}
 
-        _config_cache = {'path': str(config_path), 'data': config_data}
+        _config_cache = {'key': cache_key, 'data': config_data}
         return config_data
     except FileNotFoundError:
         print(f"Warning: Config file '{config_path}' not found. Using empty defaults.")
@@ -44,12 +71,144 @@ def get_source_extensions_and_filenames(config: dict[str, dict[str, list[Any]]])
     return extensions, filenames
 
 
-def is_source_file(filename: str, configured_extensions: set[str], configured_filenames: set[str]) -> bool:
-    """Checks if a filename is considered a source file based on loaded config."""
-    fname_lower = filename.lower()
-    if fname_lower in configured_filenames:
-        return True
-    return any(fname_lower.endswith(ext) for ext in configured_extensions)
+def compile_omit_patterns(omit_patterns: set[str]) -> tuple[frozenset[str], re.Pattern[str] | None]:
+    """
+    Splits lowercased omit entries into plain names and a single compiled glob regex.
+
+    Entries containing glob characters (*, ?, [) are translated with fnmatch and joined
+    into one alternation, so matching a name costs one regex call however many patterns
+    are configured. The regex is None when there are no glob entries.
+    """
+    glob_patterns = sorted(p for p in omit_patterns if any(c in p for c in '*?['))
+    names = frozenset(omit_patterns.difference(glob_patterns))
+    if not glob_patterns:
+        return names, None
+    return names, re.compile('|'.join(fnmatch.translate(p) for p in glob_patterns))
+
+
+def is_source_file(
+    fname_lower: str,
+    configured_extensions: tuple[str, ...],
+    configured_filenames: frozenset[str]
+) -> bool:
+    """
+    Checks if a filename is considered a source file based on loaded config.
+
+    The filename must already be lowercased; callers usually have the lowercased name
+    at hand from the omit checks. Extensions are passed as a tuple so the suffix test
+    is a single str.endswith call.
+    """
+    return fname_lower in configured_filenames or fname_lower.endswith(configured_extensions)
+
+
+def read_source_file(path: str) -> bytes | None:
+    """
+    Reads a source file as UTF-8 encoded bytes, dropping any bytes that are not valid UTF-8.
+
+    Uses a read sized from fstat instead of a buffered text-mode file object,
+    which saves several syscalls per file (isatty probe, seeks, the extra EOF read).
+    Files larger than BINARY_SNIFF_BYTES are read in two steps so that binaries can
+    be rejected after looking at their head only.
+
+    Valid UTF-8 (the common case) is returned as read; only invalid input is re-encoded.
+
+    Returns:
+        bytes | None: The file content, or None if the file looks binary (contains a NUL byte).
+    """
+    fd = os.open(path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        size = os.fstat(fd).st_size
+        data = os.read(fd, min(size, BINARY_SNIFF_BYTES)) if size else b''
+        if b'\x00' in data:
+            return None
+        # os.read may return less than asked (network/FUSE mounts, reads over ~2 GiB), so keep
+        # reading until the fstat size is reached or EOF; normally the first call gets it all
+        while len(data) < size:
+            chunk = os.read(fd, size - len(data))
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        os.close(fd)
+    try:
+        data.decode('utf-8')
+    except UnicodeDecodeError:
+        data = data.decode('utf-8', 'ignore').encode('utf-8')
+    return data
+
+
+def _write_cdata(out: BinaryIO, data: bytes) -> None:
+    """
+    Writes UTF-8 encoded data to the output as a CDATA section.
+
+    The data is handed to the writer as-is rather than concatenated into a larger buffer,
+    so large files are not copied again. Any ']]>' is split across two sections so it
+    cannot end the CDATA block early.
+    """
+    out.write(b"<![CDATA[")
+    out.write(data.replace(b"]]>", b"]]]]><![CDATA[>") if b"]]>" in data else data)
+    out.write(b"]]>")
+
+
+def _to_utf8_safe(text: str) -> str:
+    """Replaces surrogate-escaped bytes (from undecodable file names) with backslash escapes."""
+    return text.encode('utf-8', 'backslashreplace').decode('utf-8')
+
+
+def _flush_progress(progress_lines: list[str]) -> None:
+    """Writes the buffered progress lines to stdout in a single call and clears the buffer."""
+    if progress_lines:
+        sys.stdout.write("\n".join(progress_lines) + "\n")
+        progress_lines.clear()
+
+
+def _write_file_element(
+    out: BinaryIO,
+    progress_lines: list[str],
+    relative_path_posix: str,
+    pending_read: Future[bytes | None]
+) -> bool:
+    """
+    Writes a <file> element once the read of its content has finished.
+
+    Progress messages are appended to progress_lines and flushed every PROGRESS_BATCH_LINES lines.
+
+    Returns:
+        bool: True if the file was read successfully, False if it was skipped as binary
+        or an error placeholder was written.
+    """
+    try:
+        file_content = pending_read.result()
+        read_ok = True
+    except Exception as e:
+        read_error = e
+        file_content = f"Error reading file: {e}".encode('utf-8')  # Store error as content
+        read_ok = False
+
+    # Names that are not valid UTF-8 come back from os.scandir with surrogate escapes;
+    # show those bytes as backslash escapes so they can be printed and written as UTF-8
+    display_path = _to_utf8_safe(relative_path_posix)
+
+    if file_content is None:
+        progress_lines.append(f"  Skipping binary file: {display_path}")
+        return False
+
+    progress_lines.append(f"  Adding: {display_path}")
+    if not read_ok:
+        progress_lines.append(f"    Warning: Could not read file {display_path}: {_to_utf8_safe(str(read_error))}")
+
+    out.write(f"  <file>\n    <path>{escape(display_path)}</path>\n".encode('utf-8'))
+    if file_content:
+        out.write(b"    <content>")
+        _write_cdata(out, file_content)
+        out.write(b"</content>\n")
+    else:
+        out.write(b"    <content/>\n")
+    out.write(b"  </file>\n")
+
+    if len(progress_lines) >= PROGRESS_BATCH_LINES:
+        _flush_progress(progress_lines)
+    return read_ok
 
 
 def create_project_xml(
@@ -72,6 +231,8 @@ def create_project_xml(
     config = load_config(config_path)
     configured_extensions, configured_filenames = get_source_extensions_and_filenames(config)
     configured_extensions.update({ext.lower() for ext in additional_include or []})
+    source_extensions = tuple(configured_extensions)
+    source_filenames = frozenset(configured_filenames)
 
     default_omit_dirs_from_config = config.get('default_settings', {}).get('omit_dirs', [])
 
@@ -89,128 +250,90 @@ def create_project_xml(
 
     print(f"Scanning project: {project_root_abs}")
     print(f"Using config: {os.path.abspath(config_path)}")
-    print(f"Omitting directories named (case-insensitive): {sorted(list(final_omit_dirs_set))}")
+    print(f"Omitting directories/files matching (case-insensitive): {sorted(list(final_omit_dirs_set))}")
     print(f"Output XML: {output_xml_file}")
 
-    # Create XML root using ElementTree
-    xml_et_root = ElementTree.Element("project")
-    xml_et_root.set("name", os.path.basename(project_root_abs))
-
-    file_count = 0
-
-    for dirpath, dirnames, filenames_in_dir in os.walk(project_root_abs, topdown=True):
-        # Pruning: Modify dirnames in-place to prevent os.walk from descending
-        # Use the final_omit_dirs_set for efficient lookup
-        dirnames[:] = [
-            d for d in dirnames
-            if d.lower() not in final_omit_dirs_set and not any(d.lower().endswith(pattern.strip('*'))
-            for pattern in final_omit_dirs_set
-            if pattern.endswith('*'))
-        ]
-
-        for filename in filenames_in_dir:
-            # Also check if the file itself matches a pattern in omit_dirs (e.g., *.log)
-            # This is a simple check; more robust globbing could be added
-            if (
-                    filename.lower() in final_omit_dirs_set
-                    or any(
-                        filename.lower().endswith(pattern.strip('*'))
-                        for pattern in final_omit_dirs_set
-                        if pattern.endswith('*') and not pattern.startswith('*')
-                    )
-            ):
-                continue
-
-            if is_source_file(filename, configured_extensions, configured_filenames):
-                full_path = os.path.join(dirpath, filename)
-                relative_path = os.path.relpath(full_path, project_root_abs)
-                relative_path_posix = relative_path.replace(os.sep, '/')
-
-                print(f"  Adding: {relative_path_posix}")
-
-                file_element = ElementTree.SubElement(xml_et_root, "file")
-
-                path_element = ElementTree.SubElement(file_element, "path")
-                path_element.text = relative_path_posix
-
-                content_element = ElementTree.SubElement(file_element, "content")
-                try:
-                    with open(full_path, 'r', encoding='utf-8', errors='ignore') as f:
-                        file_content = f.read()
-                        # Set text for ElementTree. CDATA will be handled by minidom later.
-                        content_element.text = file_content
-                    file_count += 1
-                except Exception as e:
-                    print(f"    Warning: Could not read file {relative_path_posix}: {e}")
-                    content_element.text = f"Error reading file: {e}"  # Store error as text
-
-    # Convert ElementTree to string, then parse with minidom for pretty printing and CDATA
-    rough_string = ElementTree.tostring(xml_et_root, 'utf-8')
-
-    try:
-        reparsed_dom = minidom.parseString(rough_string)
-    except Exception as e:
-        print(f"Error: Failed to parse the intermediate XML string with minidom: {e}")
-        print(
-            "This might happen if file content itself contained malformed XML-like sequences that ET escaped, " +
-            "but minidom had trouble re-parsing even the escaped version for CDATA conversion."
-        )
-        # Fallback: write the rough (but valid) XML string from ET
+    # Precompile the omit entries once so each name is checked with a set lookup and at most
+    # one regex match instead of looping over every pattern in Python
+    omit_names, omit_regex = compile_omit_patterns(final_omit_dirs_set)
+
+    # Walk the tree first so the collected files can be read concurrently below.
+    # os.scandir is used directly so DirEntry's cached type and ready-made path can be reused.
+    # Each directory carries its POSIX path relative to the project root (with a trailing '/'),
+    # so a file's relative path is a plain concatenation instead of a per-file os.path.relpath.
+    source_files: list[tuple[str, str]] = []
+    dirs_to_scan = [(project_root_abs, '')]
+    while dirs_to_scan:
+        dir_path, relative_dir_posix = dirs_to_scan.pop()
+        subdirs = []
         try:
-            with open(output_xml_file, 'wb') as f:  # 'wb' for 'utf-8' encoded bytes
-                f.write(rough_string)
-            print(
-                f"\nSuccessfully created XML (raw, non-pretty-printed): {output_xml_file} ({file_count} files included)")
-        except IOError as ioe:
-            print(f"Error: Could not write to output file {output_xml_file}: {ioe}")
-        return
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+
+                    if is_dir:
+                        # Pruning: Don't descend into omitted directories or (like os.walk) symlinks
+                        dl = entry.name.lower()
+                        if (
+                                dl not in omit_names
+                                and not (omit_regex and omit_regex.match(dl))
+                                and not entry.is_symlink()
+                        ):
+                            subdirs.append((entry.path, f"{relative_dir_posix}{entry.name}/"))
+                        continue
+
+                    # Also check if the file itself matches a name or pattern in omit_dirs (e.g., *.log)
+                    fl = entry.name.lower()
+                    if fl in omit_names or (omit_regex and omit_regex.match(fl)):
+                        continue
+
+                    if is_source_file(fl, source_extensions, source_filenames):
+                        source_files.append((entry.path, relative_dir_posix + entry.name))
+        except OSError:
+            # Unreadable directories are skipped, matching os.walk's default behaviour
+            pass
+
+        # Push in reverse so subdirectories are visited in scan order, depth-first like os.walk
+        dirs_to_scan.extend(reversed(subdirs))
 
-    # Ensure file content is within CDATA sections using minidom
-    project_node_minidom = reparsed_dom.getElementsByTagName("project")[0]
-    file_nodes_minidom = project_node_minidom.getElementsByTagName("file")
-
-    for file_node in file_nodes_minidom:
-        content_nodes = file_node.getElementsByTagName("content")
-        if content_nodes:
-            content_node_minidom = content_nodes[0]
-            # Consolidate all child nodes of <content> (e.g. text, entities) into a single string
-            text_parts = []
-            for child in content_node_minidom.childNodes:
-                if child.nodeType == child.TEXT_NODE:
-                    text_parts.append(child.data)
-                elif child.nodeType == child.CDATA_SECTION_NODE:  # Should not happen yet, but good to handle
-                    text_parts.append(child.data)
-                # Potentially handle other node types if necessary, or log warning
-
-            full_text_content = "".join(text_parts)
-
-            # Remove old children
-            while content_node_minidom.firstChild:
-                content_node_minidom.removeChild(content_node_minidom.firstChild)
-
-            # Add new CDATA section
-            if full_text_content:  # Only create CDATA if there's content
-                cdata_node = reparsed_dom.createCDATASection(full_text_content)
-                content_node_minidom.appendChild(cdata_node)
-            # If content was empty (e.g. error message "Error reading file: ...") and we want it empty,
-            # or if it was genuinely an empty file, this will result in <content></content>
-            # If we want to put the error message *inside* CDATA, ensure full_text_content has it.
-            # The current ET.SubElement sets text, so it should be there.
-            elif content_node_minidom.getAttribute("error_placeholder"):  # A bit of a hack if we set this attribute earlier
-                content_node_minidom.appendChild(
-                    reparsed_dom.createCDATASection(content_node_minidom.getAttribute("error_placeholder"))
-                )
+    file_count = 0
+    progress_lines: list[str] = []
 
     try:
-        with open(output_xml_file, 'w', encoding='utf-8') as f:
-            # minidom's toprettyxml adds an XML declaration by default.
-            # It also handles encoding.
-            f.write(reparsed_dom.toprettyxml(indent="  ", encoding="utf-8").decode('utf-8'))
+        # Stream the document to disk one <file> element at a time instead of building the whole
+        # tree in memory. The schema is fixed, so it is written directly as UTF-8 bytes and file
+        # contents go out exactly as read. The layout matches what minidom's toprettyxml used to produce.
+        with (
+            open(output_xml_file, 'wb', buffering=OUTPUT_BUFFER_SIZE) as out,
+            ThreadPoolExecutor(max_workers=READ_WORKERS) as executor,
+        ):
+            out.write(b'<?xml version="1.0" encoding="utf-8"?>\n')
+            project_name = _to_utf8_safe(os.path.basename(project_root_abs))
+            out.write(f"<project name={quoteattr(project_name)}>\n".encode('utf-8'))
+
+            # Reads run at most READ_AHEAD_FILES ahead of the writer, which keeps the output in
+            # walk order and bounds how many file contents are held in memory at once
+            pending_reads: deque[tuple[str, Future[bytes | None]]] = deque()
+            for full_path, relative_path_posix in source_files:
+                pending_reads.append((relative_path_posix, executor.submit(read_source_file, full_path)))
+                if len(pending_reads) >= READ_AHEAD_FILES:
+                    file_count += _write_file_element(out, progress_lines, *pending_reads.popleft())
+            while pending_reads:
+                file_count += _write_file_element(out, progress_lines, *pending_reads.popleft())
+
+            out.write(b"</project>\n")
+        _flush_progress(progress_lines)
         print(f"\nSuccessfully created XML: {output_xml_file} ({file_count} files included)")
     except IOError as e:
+        _flush_progress(progress_lines)
         print(f"Error: Could not write to output file {output_xml_file}: {e}")
     except Exception as e:
-        print(f"Error during final XML writing: {e}")
+        _flush_progress(progress_lines)
+        print(f"Error during XML writing: {e}")
+        print(f"The output file {output_xml_file} is incomplete.")
 
 
 def main() -> None:
@@ -241,6 +364,7 @@ def main() -> None:
 
     if args.debug:
         print("Debug mode enabled.")
+        import debugpy  # Imported lazily; it is slow to import and only needed here
         debugpy.listen(("localhost", 5678))
         print("Debugging server started. Attach your debugger.")
         debugpy.wait_for_client()